@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import time
+import itertools
 
 # 引入原有逻辑
 from data_utils import (
@@ -9,9 +10,7 @@ from data_utils import (
     validate_stock_code, 
     get_stock_name_by_code, 
     search_stocks, 
-    get_clean_market_data, 
-    get_clean_fundamental_data, 
-    get_market_environment_data
+    build_analysis
 )
 from core_logic import call_deepseek_api, generate_analysis_prompt
 
@@ -349,56 +348,33 @@ def run_app():
 
         # 2. 数据加载 & AI 调用 (先处理，后展示)
         with st.status("🔄 正在构建多因子分析模型...", expanded=True) as status:
-            daily_data = get_clean_market_data(stock_code)
+            # 行情 / 基本面 / 市场环境并发获取，结果按股票缓存
+            daily_data, fund_data, mkt_data = build_analysis(stock_code)
             if "错误" in daily_data:
                 status.update(label="❌ 失败", state="error")
                 st.error(daily_data["错误"])
                 return
-            fund_data = get_clean_fundamental_data(stock_code, daily_data)
-            mkt_data = get_market_environment_data(stock_code)
             
-            # 后台调用AI
+            # 构建 Prompt，AI 报告在下方以流式输出
             prompt = generate_analysis_prompt(
                 stock_code, stock_name, predict_cycle, 
                 daily_data, fund_data, mkt_data, 
                 style=analysis_style
             )
-            analysis_res = call_deepseek_api(prompt)
             
-            status.update(label="✅ 数据获取与AI分析完成", state="complete")
+            status.update(label="✅ 数据获取完成", state="complete")
             time.sleep(0.5)
 
-        # 3. 记录历史 (此时所有数据都准备好了)
-        new_record = {
-            "分析时间": datetime.now().strftime('%Y-%m-%d %H:%M'),
-            "代码": stock_code, "名称": stock_name, "风格": analysis_style, "周期": predict_cycle,
-            "最新价": daily_data.get('收盘价'), "涨跌幅": daily_data.get('涨跌幅'),
-            "成交量": daily_data.get('成交量'), "换手率": daily_data.get('换手率'),
-            "PE(TTM)": fund_data.get('PE(TTM)'), "PB": fund_data.get('PB'),
-            "总市值": fund_data.get('总市值'), "行业": fund_data.get('所属行业'),
-            "市场情绪": mkt_data.get('市场情绪'), "指数涨跌": mkt_data.get('市场指数涨跌幅'),
-            "AI分析报告": analysis_res
-        }
-        
-        # 去重逻辑
-        should_save = True
-        if st.session_state.history_data:
-            last = st.session_state.history_data[0]
-            if (last["代码"] == stock_code and last["风格"] == analysis_style and last["周期"] == predict_cycle):
-                should_save = False
-        
-        if should_save:
-            st.session_state.history_data.insert(0, new_record)
-            if len(st.session_state.history_data) > 50: st.session_state.history_data.pop()
-
-        # 4. 开始渲染界面：核心指标区
+        # 3. 开始渲染界面：核心指标区
         st.markdown("### 📈 核心概览")
         c1, c2, c3, c4 = st.columns(4, gap="large")
         
         pchg = daily_data.get('涨跌幅', '0%')
+        # 按展示精度 (两位小数) 的数值判断涨跌，不再解析字符串
+        chg = round(daily_data['_snapshot'].pct_chg, 2)
         trend = "neutral"
-        if '-' in pchg: trend = "down"
-        elif pchg != '0.00%': trend = "up"
+        if chg < 0: trend = "down"
+        elif chg > 0: trend = "up"
 
         with c1: render_data_card("Close", "最新收盘", daily_data.get('收盘价'), pchg, trend)
         with c2: render_data_card("Volume", "成交量", daily_data.get('成交量'), f"换手: {daily_data.get('换手率')}")
@@ -407,7 +383,7 @@ def run_app():
 
         st.markdown("<br>", unsafe_allow_html=True)
 
-        # 5. 详细指标面板
+        # 4. 详细指标面板
         col_tech, col_market = st.columns([2, 1], gap="large")
         
         with col_tech:
@@ -476,7 +452,7 @@ def run_app():
             </div>
             """, unsafe_allow_html=True)
 
-        # 6. AI 报告展示
+        # 5. AI 报告展示 (流式输出)
         icon_map = {"稳健理智": "🧐", "短线博弈": "⚡", "激进犀利": "🔥"}
         current_icon = icon_map.get(analysis_style, "🤖")
         
@@ -491,8 +467,14 @@ def run_app():
             </div>
         """, unsafe_allow_html=True)
 
-        if analysis_res.startswith("❌"): st.error(analysis_res)
-        else: st.markdown(analysis_res)
+        # 未配置密钥时首段即为错误提示，单独用 st.error 展示
+        stream = call_deepseek_api(prompt)
+        first = next(stream, "")
+        if first.startswith("❌"):
+            st.error(first)
+            analysis_res = first
+        else:
+            analysis_res = st.write_stream(itertools.chain([first], stream))
         
         st.markdown(f"""
             <div style="text-align:right; margin-top:30px; padding-top:20px; border-top:1px dashed #eee; color:#ccc; font-size:0.8rem;">
@@ -501,6 +483,29 @@ def run_app():
         </div>
         """, unsafe_allow_html=True)
 
+        # 6. 记录历史 (AI 报告输出完毕后再保存)
+        new_record = {
+            "分析时间": datetime.now().strftime('%Y-%m-%d %H:%M'),
+            "代码": stock_code, "名称": stock_name, "风格": analysis_style, "周期": predict_cycle,
+            "最新价": daily_data.get('收盘价'), "涨跌幅": daily_data.get('涨跌幅'),
+            "成交量": daily_data.get('成交量'), "换手率": daily_data.get('换手率'),
+            "PE(TTM)": fund_data.get('PE(TTM)'), "PB": fund_data.get('PB'),
+            "总市值": fund_data.get('总市值'), "行业": fund_data.get('所属行业'),
+            "市场情绪": mkt_data.get('市场情绪'), "指数涨跌": mkt_data.get('市场指数涨跌幅'),
+            "AI分析报告": analysis_res
+        }
+        
+        # 去重逻辑
+        should_save = True
+        if st.session_state.history_data:
+            last = st.session_state.history_data[0]
+            if (last["代码"] == stock_code and last["风格"] == analysis_style and last["周期"] == predict_cycle):
+                should_save = False
+        
+        if should_save:
+            st.session_state.history_data.insert(0, new_record)
+            if len(st.session_state.history_data) > 50: st.session_state.history_data.pop()
+
     # ===================== 5. 历史记录 (底部常驻) =====================
     if st.session_state.history_data:
         st.markdown("<br><hr><br>", unsafe_allow_html=True)
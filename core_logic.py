@@ -1,6 +1,12 @@
 import os
+import time
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
 import streamlit as st
-from openai import OpenAI
+import httpx
+from openai import OpenAI, DefaultHttpxClient
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -15,46 +21,92 @@ ARK_API_KEY = get_config_value("ARK_API_KEY")
 ARK_MODEL_ENDPOINT = get_config_value("ARK_MODEL_ENDPOINT") 
 ARK_API_URL = "https://ark.cn-beijing.volces.com/api/v3"
 
+# 客户端只建一次，后续请求复用其连接池，省去每次的 TCP/TLS 握手
+# DefaultHttpxClient 保留 openai 默认的超时设置，只放宽长连接数量
+@functools.lru_cache(maxsize=1)
+def get_deepseek_client():
+    return OpenAI(
+        base_url=ARK_API_URL,
+        api_key=ARK_API_KEY,
+        http_client=DefaultHttpxClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=8))
+    )
+
+# 同一天对同一只股票重复分析时 Prompt 完全相同，直接复用已生成的报告
+# key 为 sha256(接口地址 + 接入点 + Prompt)，value 为 (生成时间, 完整文本)
+_COMPLETION_CACHE = OrderedDict()
+_COMPLETION_CACHE_SIZE = 256
+_COMPLETION_CACHE_TTL = 3600
+_COMPLETION_CACHE_LOCK = threading.Lock()
+
+def _call_deepseek_uncached(prompt):
+    """实际请求模型的流式生成器，出错时直接抛出，由 call_deepseek_api 统一处理"""
+    completion = get_deepseek_client().chat.completions.create(
+        model=ARK_MODEL_ENDPOINT,
+        messages=[{"role": "user", "content": prompt}],
+        # 提高 temperature 可以让 AI 更敢说，更有创造力
+        temperature=0.6, 
+        max_tokens=4000,
+        stream=True
+    )
+    for chunk in completion:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
 def call_deepseek_api(prompt):
+    """
+    流式调用 DeepSeek，逐段 yield 文本，调用方用 st.write_stream 边生成边渲染
+    命中缓存时一次性返回完整报告；只缓存完整生成成功的结果
+    """
     if not ARK_API_KEY or not ARK_MODEL_ENDPOINT:
-        return "❌ 错误: 未配置 API Key 或 Endpoint ID。"
+        yield "❌ 错误: 未配置 API Key 或 Endpoint ID。"
+        return
+
+    key = hashlib.sha256(f"{ARK_API_URL}|{ARK_MODEL_ENDPOINT}|{prompt}".encode("utf-8")).hexdigest()
+    with _COMPLETION_CACHE_LOCK:
+        hit = _COMPLETION_CACHE.get(key)
+        if hit:
+            # 命中即移到队尾 (最近使用)；过期条目直接删除，不等淘汰
+            if time.time() - hit[0] < _COMPLETION_CACHE_TTL:
+                _COMPLETION_CACHE.move_to_end(key)
+            else:
+                del _COMPLETION_CACHE[key]
+                hit = None
+    if hit:
+        yield hit[1]
+        return
 
+    parts = []
     try:
-        client = OpenAI(base_url=ARK_API_URL, api_key=ARK_API_KEY)
-        
-        completion = client.chat.completions.create(
-            model=ARK_MODEL_ENDPOINT,
-            messages=[{"role": "user", "content": prompt}],
-            # 提高 temperature 可以让 AI 更敢说，更有创造力
-            temperature=0.6, 
-            max_tokens=4000
-        )
-        return completion.choices[0].message.content
+        for text in _call_deepseek_uncached(prompt):
+            parts.append(text)
+            yield text
     except Exception as e:
-        return f"API调用失败: {str(e)}"
+        yield f"API调用失败: {str(e)}"
+        return
+
+    with _COMPLETION_CACHE_LOCK:
+        _COMPLETION_CACHE[key] = (time.time(), "".join(parts))
+        _COMPLETION_CACHE.move_to_end(key)
+        while len(_COMPLETION_CACHE) > _COMPLETION_CACHE_SIZE:
+            _COMPLETION_CACHE.popitem(last=False)
 
 def generate_analysis_prompt(stock_code, stock_name, predict_cycle, daily_data, fundamental_data, market_data, style="稳健理智"):
     """
     根据 style 生成不同风格的 Prompt
     """
     
-    # 数据格式化
-    def fmt(d): return {k: str(v) for k, v in d.items()}
-    daily = fmt(daily_data)
-    fund = fmt(fundamental_data)
-    mkt = fmt(market_data)
-    
+    # 三组数据均为 get_clean_* 返回的字符串字典，直接取值，缺失项显示 "-"
     base_info = f"""
     ## 📊 标的数据
     - **股票**：{stock_name} ({stock_code})
     - **周期**：{predict_cycle}
-    - **收盘**：{daily.get('收盘价')} (涨跌 {daily.get('涨跌幅')})
-    - **均线**：MA5 {daily.get('5日均线')}, MA20 {daily.get('20日均线')}
-    - **指标**：MACD {daily.get('MACD')}, RSI {daily.get('RSI')}, 波动率 {daily.get('波动率')}
-    - **布林**：上轨 {daily.get('布林上轨')}, 下轨 {daily.get('布林下轨')}
-    - **资金**：成交量 {daily.get('成交量')}, 换手率 {daily.get('换手率')}
-    - **估值**：PE {fund.get('PE(TTM)')}, PB {fund.get('PB')}, 市值 {fund.get('总市值')}
-    - **环境**：市场情绪 {mkt.get('市场情绪')}, 指数涨跌 {mkt.get('市场指数涨跌幅')}
+    - **收盘**：{daily_data.get('收盘价', '-')} (涨跌 {daily_data.get('涨跌幅', '-')})
+    - **均线**：MA5 {daily_data.get('5日均线', '-')}, MA20 {daily_data.get('20日均线', '-')}
+    - **指标**：MACD {daily_data.get('MACD', '-')}, RSI {daily_data.get('RSI', '-')}, 波动率 {daily_data.get('波动率', '-')}
+    - **布林**：上轨 {daily_data.get('布林上轨', '-')}, 下轨 {daily_data.get('布林下轨', '-')}
+    - **资金**：成交量 {daily_data.get('成交量', '-')}, 换手率 {daily_data.get('换手率', '-')}
+    - **估值**：PE {fundamental_data.get('PE(TTM)', '-')}, PB {fundamental_data.get('PB', '-')}, 市值 {fundamental_data.get('总市值', '-')}
+    - **环境**：市场情绪 {market_data.get('市场情绪', '-')}, 指数涨跌 {market_data.get('市场指数涨跌幅', '-')}
     """
 
     # === 风格 1：稳健理智 (默认) ===
@@ -1,13 +1,28 @@
 import tushare as ts
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dataclasses import dataclass
+import threading
+import functools
+import math
+import time
 import os
-import re
 import streamlit as st
 
+try:
+    from numba import njit
+except ImportError:
+    # 未安装 numba 时退化为普通 Python 函数，结果一致，只是慢一些
+    def njit(*args, **kwargs):
+        if args and callable(args[0]): return args[0]
+        return lambda f: f
+
 # ===================== 基础工具 =====================
 
-def get_tushare_pro():
+def _build_tushare_pro():
     try:
         if hasattr(st, 'secrets') and 'TUSHARE_TOKEN' in st.secrets:
             token = st.secrets['TUSHARE_TOKEN']
@@ -19,14 +34,30 @@ def get_tushare_pro():
         return ts.pro_api()
     except: return None
 
+# pro_api 客户端每个进程只构建一次；只缓存构建成功的客户端，
+# Token 缺失或初始化失败时下次调用会重试，加锁避免线程池里并发重复构建
+_PRO = None
+_PRO_LOCK = threading.Lock()
+
+def get_tushare_pro():
+    global _PRO
+    if _PRO is None:
+        with _PRO_LOCK:
+            if _PRO is None: _PRO = _build_tushare_pro()
+    return _PRO
+
+# A股代码首位 -> 交易所后缀
+_A_SUFFIX = {'6': ".SH", '0': ".SZ", '3': ".SZ", '8': ".BJ", '4': ".BJ"}
+
 def validate_stock_code(code):
-    clean = re.sub(r'[^\d]', '', str(code))
+    # str.isdecimal 与正则 \d 的匹配范围一致，filter 在 C 层逐字符过滤，省去正则引擎；
+    # 输入本身就是纯数字 (最常见) 时直接使用，不再逐字符拼接
+    clean = str(code)
+    if not clean.isdecimal(): clean = ''.join(filter(str.isdecimal, clean))
     if len(clean) == 5: return True, clean + ".HK"
     if len(clean) == 6:
-        if clean.startswith('6'): s = ".SH"
-        elif clean.startswith(('0','3')): s = ".SZ"
-        elif clean.startswith(('8','4')): s = ".BJ"
-        else: return False, "未知前缀"
+        s = _A_SUFFIX.get(clean[0])
+        if not s: return False, "未知前缀"
         return True, clean + s
     return False, "格式错误"
 
@@ -34,37 +65,189 @@ def get_stock_name_by_code(ts_code):
     pro = get_tushare_pro()
     if not pro: return "未连接"
     try:
-        if ts_code.endswith('.HK'):
-            df = pro.hk_basic(ts_code=ts_code)
-        else:
-            df = pro.stock_basic(ts_code=ts_code)
-        if not df.empty: return df.iloc[0]['name']
+        df = _load_hk_universe() if ts_code.endswith('.HK') else _load_a_universe()
+        if ts_code in df.index: return df.at[ts_code, 'name']
     except: pass
     return ts_code
 
+# 全量上市列表一天内基本不变：落盘为 parquet，进程重启后 24 小时内直接读本地文件
+_CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+_BASIC_FIELDS = {"stock_basic": "ts_code,name,industry", "hk_basic": "ts_code,name"}
+
+def _cached_basic(kind, ttl=86400):
+    path = _CACHE_DIR / f"{kind}.parquet"
+    fields = _BASIC_FIELDS[kind]
+    try:
+        if path.exists() and time.time() - path.stat().st_mtime < ttl:
+            df = pd.read_parquet(path)
+            # 字段有增减时旧文件作废，重新拉取
+            if set(fields.split(',')) <= set(df.columns): return df
+    except Exception as e:
+        print(f"Cache Read Error: {e}")
+
+    pro = get_tushare_pro()
+    if kind == "hk_basic": df = pro.hk_basic(list_status='L', fields=fields)
+    else: df = pro.stock_basic(exchange='', list_status='L', fields=fields)
+    try:
+        # 先写临时文件再替换，避免并发读到写了一半的文件
+        _CACHE_DIR.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        df.to_parquet(tmp, index=False)
+        tmp.replace(path)
+    except Exception as e:
+        print(f"Cache Write Error: {e}")
+    return df
+
+def _with_search_key(df):
+    # 名称与代码拼成一列小写检索键，搜索时只需单列一次扫描；\x00 分隔避免跨字段误匹配
+    # 同时以 ts_code 建索引，按代码查名称 / 行业时走哈希查找
+    df = df.assign(_search=(df['name'].fillna('') + '\x00' + df['ts_code']).str.lower())
+    return df.set_index('ts_code', drop=False)
+
+# 进程内再按天缓存一层，搜索时连磁盘都不用读
+@st.cache_data(ttl=86400, show_spinner=False)
+def _load_a_universe():
+    return _with_search_key(_cached_basic("stock_basic"))
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _load_hk_universe():
+    return _with_search_key(_cached_basic("hk_basic"))
+
+def _match_universe(df, keyword, kind):
+    if df.empty: return []
+    # 按字面量子串匹配，不经过正则引擎
+    mask = df['_search'].str.contains(keyword.lower(), regex=False, na=False)
+    sub = df.loc[mask, ['ts_code', 'name']].head(5)
+    return sub.rename(columns={'ts_code': '代码', 'name': '名称'}).assign(类型=kind).to_dict('records')
+
 def search_stocks(keyword):
     pro = get_tushare_pro()
     if not pro: return []
     res = []
     try:
+        # 两张列表并发加载，冷启动时只等一次网络往返
+        fut_a = _EXECUTOR.submit(_load_a_universe)
+        fut_hk = _EXECUTOR.submit(_load_hk_universe)
         # A股
-        df = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name')
-        if not df.empty:
-            mask = df['name'].str.contains(keyword, na=False) | df['ts_code'].str.contains(keyword, na=False)
-            res.extend([{"代码":r['ts_code'],"名称":r['name'],"类型":"A股"} for _,r in df[mask].head(5).iterrows()])
+        res.extend(_match_universe(fut_a.result(), keyword, "A股"))
         # 港股
-        try:
-            df_hk = pro.hk_basic(list_status='L', fields='ts_code,name')
-            if not df_hk.empty:
-                mask = df_hk['name'].str.contains(keyword, na=False) | df_hk['ts_code'].str.contains(keyword, na=False)
-                res.extend([{"代码":r['ts_code'],"名称":r['name'],"类型":"港股"} for _,r in df_hk[mask].head(5).iterrows()])
+        try: res.extend(_match_universe(fut_hk.result(), keyword, "港股"))
         except: pass
         return res[:10]
     except: return []
 
+# ===================== 并发数据拉取 =====================
+
+@functools.lru_cache(maxsize=8)
+def _date_bounds_on(ordinal, days):
+    today = date.fromordinal(ordinal)
+    return (today.strftime('%Y%m%d'),) + tuple((today - timedelta(days=d)).strftime('%Y%m%d') for d in days)
+
+def _date_bounds(*days):
+    """返回 (今天, days[0] 天前, days[1] 天前, ...) 的 YYYYMMDD 字符串；按日期缓存，同一天内不再重复 strftime"""
+    return _date_bounds_on(date.today().toordinal(), days)
+
+# K线只拉取指标计算用得到的列
+_BAR_FIELDS = 'trade_date,close,vol,pct_chg'
+
+# 已收盘的历史K线不会再变：按股票落盘为 parquet，之后只增量拉取最后一个已存交易日之后的数据
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_bars(ts_code, start, end):
+    """
+    返回 [start, end] 区间的日K线 (最新在前，与 Tushare 返回顺序一致)
+    文件 attrs['since'] 记录本地已完整覆盖的起始日期，请求窗口更早时整段重拉
+    """
+    path = _CACHE_DIR / "bars" / f"{ts_code}.parquet"
+    pro = get_tushare_pro()
+    fetch = pro.hk_daily if ts_code.endswith('.HK') else pro.daily
+
+    old = None
+    try:
+        if path.exists():
+            old = pd.read_parquet(path)
+            # 字段有增减、或覆盖范围不够时旧文件作废
+            if old.empty or old.attrs.get('since', end) > start or not set(_BAR_FIELDS.split(',')) <= set(old.columns):
+                old = None
+    except Exception as e:
+        print(f"Cache Read Error: {e}")
+        old = None
+
+    if old is None:
+        df, since = fetch(ts_code=ts_code, start_date=start, end_date=end, fields=_BAR_FIELDS), start
+    else:
+        since, last = old.attrs['since'], old['trade_date'].max()
+        if last >= end: df = old
+        else:
+            # 从最后一个已存交易日起拉 (含当天)，接口对该日有修正时以新数据为准
+            new = fetch(ts_code=ts_code, start_date=last, end_date=end, fields=_BAR_FIELDS)
+            df = pd.concat([new, old], ignore_index=True).drop_duplicates('trade_date', keep='first')
+
+    if df is not old and not df.empty:
+        df = df.sort_values('trade_date', ascending=False, ignore_index=True)
+        try:
+            # 先写临时文件再替换，避免并发读到写了一半的文件
+            (_CACHE_DIR / "bars").mkdir(parents=True, exist_ok=True)
+            df.attrs = {'since': since}
+            tmp = path.with_suffix(".tmp")
+            df.to_parquet(tmp, index=False)
+            tmp.replace(path)
+        except Exception as e:
+            print(f"Cache Write Error: {e}")
+
+    return df[(df['trade_date'] >= start) & (df['trade_date'] <= end)].reset_index(drop=True)
+
+# 一次报告涉及的 Tushare 请求彼此独立，放进线程池并发发出以重叠网络等待
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+def fetch_all(ts_code, min_bars=60):
+    """
+    并发提交单只股票报告所需的全部 Tushare 请求，返回 {名称: Future}
+    下游 get_clean_* 只消费 Future 的结果，不再各自串行调用 pro.*
+    """
+    pro = get_tushare_pro()
+    if not pro: return {}
+
+    # MACD 的 EMA26 约需 60 根K线才能收敛：按每周 5 个交易日折算自然日，另加 20 天覆盖春节等长假
+    days = min_bars * 7 // 5 + 20
+    end, start, start_index = _date_bounds(days, 10)
+
+    # K线走本地增量缓存，窗口拉长后每次仍只请求新增的交易日
+    jobs = {"index": (pro.index_daily, dict(ts_code='399300.SZ', start_date=start_index, end_date=end)),
+            "daily": (_cached_bars, dict(ts_code=ts_code, start=start, end=end))}
+    if ts_code.endswith('.HK'):
+        jobs["hk_index"] = (pro.index_daily, dict(ts_code='HSI', start_date=start_index, end_date=end))
+    else:
+        jobs["daily_basic"] = (_latest_valuation, dict(ts_code=ts_code))
+
+    return {k: _EXECUTOR.submit(fn, **kw) for k, (fn, kw) in jobs.items()}
+
 # ===================== 核心指标获取 (仅A股) =====================
 
-def get_latest_metrics(pro, ts_code):
+def _latest_row(df):
+    """
+    取 trade_date 最新的一行：单次 argmax 扫描，不排序也不依赖接口返回顺序
+    trade_date 为 YYYYMMDD 字符串，字典序即时间序
+    """
+    return df.iloc[df['trade_date'].to_numpy().argmax()]
+
+def _latest_value(df, col):
+    """只取最新一行的单个字段：按位置 iat 直接读标量，不为整行构建 Series"""
+    return df.iat[df['trade_date'].to_numpy().argmax(), df.columns.get_loc(col)]
+
+# daily_basic 每天收盘后才更新一次，单独缓存 30 分钟；
+# 缓存里只放最新一行的小 dict，不放整张 DataFrame
+_VALUATION_FIELDS = ['turnover_rate', 'pe_ttm', 'pb', 'total_mv']
+
+@st.cache_data(ttl=1800, show_spinner=False)
+def _latest_valuation(ts_code):
+    end, start = _date_bounds(20)
+    df = get_tushare_pro().daily_basic(ts_code=ts_code, start_date=start, end_date=end,
+                                       fields='trade_date,' + ','.join(_VALUATION_FIELDS))
+    # 取最近一个有估值数据的交易日
+    df = df.dropna(subset=_VALUATION_FIELDS, how='all')
+    return _latest_row(df).to_dict() if not df.empty else {}
+
+def get_latest_metrics(ts_code, futures):
     """
     统一获取基本面指标
     注意：Tushare 目前仅支持 A股 的 daily_basic
@@ -86,14 +269,8 @@ def get_latest_metrics(pro, ts_code):
 
     # A股：正常获取
     try:
-        end = datetime.now().strftime('%Y%m%d')
-        start = (datetime.now() - timedelta(days=20)).strftime('%Y%m%d')
-        
-        fields = 'trade_date,turnover_rate,pe_ttm,pb,total_mv'
-        df = pro.daily_basic(ts_code=ts_code, start_date=start, end_date=end, fields=fields)
-        
-        if not df.empty:
-            r = df.sort_values('trade_date', ascending=False).iloc[0]
+        r = futures["daily_basic"].result()
+        if r:
             if pd.notna(r.get('turnover_rate')): metrics['turnover_rate'] = f"{r['turnover_rate']:.2f}%"
             if pd.notna(r.get('pe_ttm')): metrics['pe_ttm'] = f"{r['pe_ttm']:.2f}"
             if pd.notna(r.get('pb')): metrics['pb'] = f"{r['pb']:.2f}"
@@ -107,85 +284,242 @@ def get_latest_metrics(pro, ts_code):
 
 # ===================== 技术指标计算 =====================
 
-def get_enhanced_technical_indicators(df):
-    try:
-        if df.empty: return df
-        df = df.sort_values('trade_date').reset_index(drop=True)
-        close = df['close']
-        
-        df['ma5'] = close.rolling(5).mean()
-        df['ma10'] = close.rolling(10).mean()
-        df['ma20'] = close.rolling(20).mean()
-        
-        exp1 = close.ewm(span=12, adjust=False).mean()
-        exp2 = close.ewm(span=26, adjust=False).mean()
-        df['dif'] = exp1 - exp2
-        df['dea'] = df['dif'].ewm(span=9, adjust=False).mean()
-        df['macd'] = (df['dif'] - df['dea']) * 2
-        
-        delta = close.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-        
-        df['bb_mid'] = close.rolling(20).mean()
-        std = close.rolling(20).std()
-        df['bb_up'] = df['bb_mid'] + 2 * std
-        df['bb_low'] = df['bb_mid'] - 2 * std
-        df['volatility'] = df['pct_chg'].rolling(20).std()
-        
-        return df
-    except: return df
+_INDICATOR_COLS = ['ma5', 'ma10', 'ma20', 'dif', 'dea', 'macd', 'rsi',
+                   'bb_up', 'bb_mid', 'bb_low', 'volatility']
+
+@njit(cache=True)
+def _window_step(x, i, w, mean, m2, cnt):
+    """
+    x[i] 进入长度为 w 的滑动窗口 (已满时同时移出 x[i-w])，Welford 方式更新均值 mean 与平方差和 m2
+    NaN 不计入 mean / m2，cnt 为窗口内有效值个数；cnt == w 才算窗口满，同 pandas rolling 默认 min_periods
+    窗口长度作为参数传入，所有均线 / 标准差共用这一个原语
+    """
+    x_new = x[i]
+    x_old = x[i - w] if i >= w else np.nan
+    new_ok = not np.isnan(x_new)
+    old_ok = not np.isnan(x_old)
+    if new_ok and old_ok:
+        # 有效值个数不变：一进一出合并为一次更新
+        new_mean = mean + (x_new - x_old) / cnt
+        m2 += (x_new - x_old) * (x_new - new_mean + x_old - mean)
+        mean = new_mean
+    else:
+        if old_ok:
+            cnt -= 1
+            if cnt == 0:
+                mean = m2 = 0.0
+            else:
+                d = x_old - mean
+                mean -= d / cnt
+                m2 -= d * (x_old - mean)
+        if new_ok:
+            cnt += 1
+            d = x_new - mean
+            mean += d / cnt
+            m2 += d * (x_new - mean)
+    return mean, m2, cnt
+
+# 显式签名 (close: float64, pct_chg: float32) 让内核在导入时即按运行时 dtype 编译 (或加载磁盘缓存)，
+# 首个请求不再等 JIT，也不会因 dtype 不同意外生成第二份特化版本
+# fastmath 只开启不影响 NaN / inf 语义的选项：输出数组用 NaN 表示窗口未满
+@njit('UniTuple(f8[:], 11)(f8[:], f4[:])', cache=True, fastmath={'reassoc', 'contract', 'arcp'})
+def _compute_indicators(close, pct_chg):
+    """
+    单次遍历计算全部技术指标，按 _INDICATOR_COLS 顺序返回 11 个数组
+    与原 pandas 实现保持一致：窗口未满或窗口内含 NaN 的位置为 NaN，EMA 为 adjust=False，标准差 ddof=1
+    EMA / RMA 递推跳过 NaN 收盘价，沿用上一个有效值，单个缺失值不会污染之后的整段序列
+    """
+    n = close.shape[0]
+    ma5 = np.full(n, np.nan)
+    ma10 = np.full(n, np.nan)
+    mid = np.full(n, np.nan)
+    up = np.full(n, np.nan)
+    low = np.full(n, np.nan)
+    dif = np.full(n, np.nan)
+    dea = np.full(n, np.nan)
+    macd = np.full(n, np.nan)
+    rsi = np.full(n, np.nan)
+    vol = np.full(n, np.nan)
+    a12, a26, a9 = 2.0 / 13, 2.0 / 27, 2.0 / 10
+
+    m5 = q5 = m10 = q10 = 0.0
+    m20 = q20 = 0.0
+    mv = qv = 0.0
+    c5 = c10 = c20 = cv = 0
+    gain = loss = 0.0
+    e12 = e26 = e9 = 0.0
+    prev = 0.0
+    nv = 0  # 已出现的有效收盘价个数
+
+    for i in range(n):
+        x = close[i]
+
+        # 均线：同一滑动窗口原语，只取均值
+        m5, q5, c5 = _window_step(close, i, 5, m5, q5, c5)
+        m10, q10, c10 = _window_step(close, i, 10, m10, q10, c10)
+        if c5 == 5: ma5[i] = m5
+        if c10 == 10: ma10[i] = m10
+
+        if not np.isnan(x):
+            # MACD：EMA 递推
+            if nv == 0:
+                e12 = e26 = x
+                e9 = 0.0
+            else:
+                e12 = a12 * x + (1 - a12) * e12
+                e26 = a26 * x + (1 - a26) * e26
+                e9 = a9 * (e12 - e26) + (1 - a9) * e9
+
+            # RSI：Wilder 平滑 (RMA, alpha=1/14)，以前 14 个涨跌的简单均值起算，同 TradingView ta.rma
+            if nv >= 1:
+                d = x - prev
+                if nv <= 14:
+                    gain += max(d, 0.0)
+                    loss += max(-d, 0.0)
+                    if nv == 14:
+                        gain /= 14
+                        loss /= 14
+                else:
+                    gain = gain * (13 / 14) + max(d, 0.0) / 14
+                    loss = loss * (13 / 14) + max(-d, 0.0) / 14
+            prev = x
+            nv += 1
+
+        if nv >= 1:
+            dif[i] = e12 - e26
+            dea[i] = e9
+            macd[i] = (dif[i] - dea[i]) * 2
+        if nv >= 15:
+            if loss > 0: rsi[i] = 100 - 100 / (1 + gain / loss)
+            elif gain > 0: rsi[i] = 100.0
+
+        # 布林带 & 波动率：20 日均值与样本标准差一次更新得到，20 日均线即布林中轨
+        m20, q20, c20 = _window_step(close, i, 20, m20, q20, c20)
+        mv, qv, cv = _window_step(pct_chg, i, 20, mv, qv, cv)
+        if c20 == 20:
+            bb_std = np.sqrt(max(q20, 0.0) / 19)
+            mid[i] = m20
+            up[i] = m20 + 2 * bb_std
+            low[i] = m20 - 2 * bb_std
+        if cv == 20: vol[i] = np.sqrt(max(qv, 0.0) / 19)
+
+    return ma5, ma10, mid, dif, dea, macd, rsi, up, mid, low, vol
+
+def _indicator_inputs(df):
+    """返回 (升序行号, close, pct_chg)，后两者为按时间升序排列的 numpy 数组"""
+    # Tushare 按 trade_date 降序返回，直接倒序即可 (O(N))；万一顺序不符再退回排序
+    dates = df['trade_date'].to_numpy()
+    order = np.arange(len(dates) - 1, -1, -1)
+    if not (dates[:-1] >= dates[1:]).all(): order = dates.argsort(kind='stable')
+    close = df['close'].to_numpy(dtype=np.float64)[order]
+    # 收盘价缺失的K线整行跳过，指标按有效K线连续计算
+    ok = ~np.isnan(close)
+    if not ok.all(): order, close = order[ok], close[ok]
+    # 涨跌幅量级小，float32 算 20 日波动率与 float64 的 4 位小数展示一致，内存流量减半；
+    # 收盘价保留 float64：两位小数价格的均值常落在 .xx5 舍入边界，float32 会改变展示值
+    pct_chg = df['pct_chg'].to_numpy(dtype=np.float32)[order]
+    return order, close, pct_chg
+
+def get_latest_indicators(df):
+    """
+    只返回最新一根K线的行情与全部指标 (dict，值为 float)
+    报告只用得到最后一行，不再为整段序列构建带指标列的 DataFrame
+    """
+    order, close, pct_chg = _indicator_inputs(df)
+    last = order[-1]
+    row = {col: float(df.iat[last, df.columns.get_loc(col)]) for col in ('close', 'pct_chg', 'vol')}
+    row.update({col: float(arr[-1]) for col, arr in zip(_INDICATOR_COLS, _compute_indicators(close, pct_chg))})
+    return row
 
 # ===================== 数据获取主入口 =====================
 
-@st.cache_data(ttl=600) 
-def get_clean_market_data(ts_code, days=90):
-    pro = get_tushare_pro()
-    if not pro: return {"错误": "Token无效"}
+# 展示用的指标字段：(展示名, 列名, 格式)
+_INDICATOR_DISPLAY = [
+    ("5日均线", "ma5", ".2f"),
+    ("10日均线", "ma10", ".2f"),
+    ("20日均线", "ma20", ".2f"),
+    ("MACD", "macd", ".4f"),
+    ("RSI", "rsi", ".2f"),
+    ("布林上轨", "bb_up", ".2f"),
+    ("布林中轨", "bb_mid", ".2f"),
+    ("布林下轨", "bb_low", ".2f"),
+    ("波动率", "volatility", ".4f"),
+]
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """最新一根K线的行情与指标原始数值 (缺失为 NaN)；展示用字符串由 to_display() 统一格式化"""
+    ts_code: str
+    close: float
+    pct_chg: float
+    vol: float
+    turnover_rate: float
+    ma5: float
+    ma10: float
+    ma20: float
+    dif: float
+    dea: float
+    macd: float
+    rsi: float
+    bb_up: float
+    bb_mid: float
+    bb_low: float
+    volatility: float
+
+    def to_display(self):
+        res = {
+            "收盘价": f"{self.close}",
+            "涨跌幅": f"{self.pct_chg:.2f}%",
+            "成交量": f"{self.vol/10000:.2f}万手",
+        }
+        # 港股 daily_basic 无数据源，A股仅当天缺数据
+        if self.ts_code.endswith('.HK'): res["换手率"] = "N/A (Tushare源缺)"
+        elif math.isnan(self.turnover_rate): res["换手率"] = "N/A"
+        else: res["换手率"] = f"{self.turnover_rate:.2f}%"
+        # 字段均为 Python float，math.isnan 直接在 C 层判断，省去 pd.notna 的类型分派
+        for label, col, spec in _INDICATOR_DISPLAY:
+            v = getattr(self, col)
+            res[label] = "-" if math.isnan(v) else format(v, spec)
+        return res
+
+# 三个取数函数在同一交易日内对 ts_code 是纯函数，缓存后页面重跑不再重复请求 Tushare
+# _futures 以下划线开头，st.cache_data 不会对其做哈希
+@st.cache_data(ttl=900, show_spinner=False)
+def get_clean_market_data(ts_code, min_bars=60, _futures=None):
+    futures = _futures or fetch_all(ts_code, min_bars)
+    if not futures: return {"错误": "Token无效"}
     
     try:
         # 1. 获取基本面指标 (A股有，港股无)
-        metrics = get_latest_metrics(pro, ts_code)
+        metrics = get_latest_metrics(ts_code, futures)
         
         # 2. 获取K线行情 (A股/港股都有)
-        end = datetime.now().strftime('%Y%m%d')
-        start = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
-        
         df = pd.DataFrame()
         if ts_code.endswith('.HK'):
-            try: df = pro.hk_daily(ts_code=ts_code, start_date=start, end_date=end)
+            try: df = futures["daily"].result()
             except Exception as e: return {"错误": f"港股接口错: {e}"}
         else:
-            df = pro.daily(ts_code=ts_code, start_date=start, end_date=end)
+            df = futures["daily"].result()
         
-        if df.empty: return {"错误": "暂无行情数据"}
+        if df.empty or df['close'].isna().all(): return {"错误": "暂无行情数据"}
         
-        # 3. 计算技术指标
-        df = get_enhanced_technical_indicators(df)
-        latest = df.iloc[-1]
-
-        return {
-            "收盘价": f"{latest['close']}",
-            "涨跌幅": f"{latest['pct_chg']:.2f}%",
-            "成交量": f"{latest['vol']/10000:.2f}万手",
-            "换手率": metrics['turnover_rate'], 
-            "5日均线": f"{latest['ma5']:.2f}" if pd.notna(latest['ma5']) else "-",
-            "10日均线": f"{latest['ma10']:.2f}" if pd.notna(latest['ma10']) else "-",
-            "20日均线": f"{latest['ma20']:.2f}" if pd.notna(latest['ma20']) else "-",
-            "MACD": f"{latest['macd']:.4f}" if pd.notna(latest['macd']) else "-",
-            "RSI": f"{latest['rsi']:.2f}" if pd.notna(latest['rsi']) else "-",
-            "布林上轨": f"{latest['bb_up']:.2f}" if pd.notna(latest['bb_up']) else "-",
-            "布林中轨": f"{latest['bb_mid']:.2f}" if pd.notna(latest['bb_mid']) else "-",
-            "布林下轨": f"{latest['bb_low']:.2f}" if pd.notna(latest['bb_low']) else "-",
-            "波动率": f"{latest['volatility']:.4f}" if pd.notna(latest['volatility']) else "-",
-            "_metrics_cache": metrics 
-        }
+        # 3. 计算技术指标，只取最新一根K线的值
+        turnover = math.nan
+        if not ts_code.endswith('.HK'):
+            try: turnover = float(futures["daily_basic"].result().get('turnover_rate', math.nan))
+            except: pass
+        snap = MarketSnapshot(ts_code=ts_code, turnover_rate=turnover, **get_latest_indicators(df))
+
+        # 展示字段保持原有中文键；_snapshot 附带原始数值，下游判断涨跌等无需再解析字符串
+        res = snap.to_display()
+        res["_metrics_cache"] = metrics
+        res["_snapshot"] = snap
+        return res
     except Exception as e: return {"错误": str(e)}
 
-def get_clean_fundamental_data(ts_code, daily_data=None):
-    pro = get_tushare_pro()
+@st.cache_data(ttl=900, show_spinner=False)
+def get_clean_fundamental_data(ts_code, daily_data=None, _futures=None):
+    futures = _futures or fetch_all(ts_code)
     
     industry = "未知"
     
@@ -194,18 +528,15 @@ def get_clean_fundamental_data(ts_code, daily_data=None):
     if daily_data and '_metrics_cache' in daily_data:
         metrics = daily_data['_metrics_cache']
     if not metrics:
-        metrics = get_latest_metrics(pro, ts_code)
+        metrics = get_latest_metrics(ts_code, futures)
 
     try:
-        # 获取行业
+        # 获取行业：直接查已缓存的全量列表 (港股列表无行业字段)
         if ts_code.endswith('.HK'):
-            try:
-                b = pro.hk_basic(ts_code=ts_code)
-                if not b.empty: industry = b.iloc[0].get('industry', '港股')
-            except: pass
+            if ts_code in _load_hk_universe().index: industry = "港股"
         else:
-            b = pro.stock_basic(ts_code=ts_code, fields='industry')
-            if not b.empty: industry = b.iloc[0]['industry']
+            b = _load_a_universe()
+            if ts_code in b.index: industry = b.at[ts_code, 'industry']
     except: pass
 
     return {
@@ -215,27 +546,25 @@ def get_clean_fundamental_data(ts_code, daily_data=None):
         "所属行业": industry
     }
 
-def get_market_environment_data(ts_code):
-    pro = get_tushare_pro()
+@st.cache_data(ttl=900, show_spinner=False)
+def get_market_environment_data(ts_code, _futures=None):
+    futures = _futures or fetch_all(ts_code)
     change, sentiment, name = "0.00%", "中性", "未知"
     try:
-        end = datetime.now().strftime('%Y%m%d')
-        start = (datetime.now() - timedelta(days=10)).strftime('%Y%m%d')
-        
         # 1. 沪深300兜底
         try:
-            df = pro.index_daily(ts_code='399300.SZ', start_date=start, end_date=end)
+            df = futures["index"].result()
             if not df.empty:
-                change = f"{df.iloc[0]['pct_chg']:.2f}%"
+                change = f"{_latest_value(df, 'pct_chg'):.2f}%"
                 name = "沪深300"
         except: pass
 
         # 2. 港股尝试恒指
         if ts_code.endswith('.HK'):
             try:
-                df = pro.index_daily(ts_code='HSI', start_date=start, end_date=end)
+                df = futures["hk_index"].result()
                 if not df.empty:
-                    change = f"{df.iloc[0]['pct_chg']:.2f}%"
+                    change = f"{_latest_value(df, 'pct_chg'):.2f}%"
                     name = "恒生指数"
             except: pass
         
@@ -246,3 +575,16 @@ def get_market_environment_data(ts_code):
         except: pass
     except: pass
     return {"市场指数涨跌幅": f"{change} ({name})", "市场情绪": sentiment}
+
+@st.cache_data(ttl=900, show_spinner=False)
+def build_analysis(ts_code):
+    """
+    一次取齐报告所需的行情、基本面、市场环境三组数据
+    三者共享同一批并发请求 (fetch_all)，整体按股票缓存
+    """
+    futures = fetch_all(ts_code)
+    daily_data = get_clean_market_data(ts_code, _futures=futures)
+    if "错误" in daily_data: return daily_data, {}, {}
+    fund_data = get_clean_fundamental_data(ts_code, daily_data, _futures=futures)
+    mkt_data = get_market_environment_data(ts_code, _futures=futures)
+    return daily_data, fund_data, mkt_data